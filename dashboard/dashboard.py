@@ -1,26 +1,48 @@
 #!/usr/bin/env python3
 import dash
-from dash import dcc, html
-from dash.dependencies import Input, Output
+from dash import dcc, html, ctx, no_update
+from dash.dependencies import Input, Output, State
 import dash_bootstrap_components as dbc
-import plotly.graph_objs as go
+from dash_extensions import WebSocket
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import orjson
 import logging
 import numpy as np
 
 # URL del endpoint REST que expone el estado de la malla
 MALLA_ENDPOINT = "http://localhost:5000/api/malla"
+# Canal WebSocket por el que malla_watcher empuja cada nuevo estado
+MALLA_WS_URL = "ws://localhost:5000/ws/malla"
+
+# Sondeo de respaldo (ms): espera base entre consultas y tope del backoff ante errores
+INTERVALO_SONDEO = 10 * 1000
+INTERVALO_SONDEO_MAX = 30 * 1000
+FACTOR_BACKOFF = 1.25
+
+# Sesión HTTP compartida: reutiliza las conexiones keep-alive entre consultas
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=1))
+
+# Último estado recibido y su ETag, para consultas condicionales (If-None-Match)
+ultimo_estado = {"etag": None, "estado": None}
 
 def obtener_estado_malla():
     """
     Realiza una solicitud GET al endpoint REST para obtener el estado de la malla.
     Retorna un diccionario con la respuesta JSON o un diccionario con error.
+    Si la malla no cambió desde la última consulta (304), reutiliza el estado ya parseado.
     """
     try:
-        response = requests.get(MALLA_ENDPOINT, timeout=5)
+        headers = {"If-None-Match": ultimo_estado["etag"]} if ultimo_estado["etag"] else {}
+        response = SESSION.get(MALLA_ENDPOINT, headers=headers, timeout=(2, 5))
+        if response.status_code == 304 and ultimo_estado["estado"] is not None:
+            return ultimo_estado["estado"]
         response.raise_for_status()
-        return response.json()
+        estado = response.json()
+        ultimo_estado.update(etag=response.headers.get("ETag"), estado=estado)
+        return estado
     except Exception as e:
         logging.error(f"Error al obtener estado de la malla: {e}")
         return {"error": str(e)}
@@ -63,9 +85,12 @@ app.layout = dbc.Container([
         ], width=6)
     ], className="my-3"),
     
-    # Intervalo para actualización periódica
+    # Estado empujado por WebSocket; el intervalo solo sondea mientras el WebSocket no está abierto.
+    # El Store guarda el último estado recibido (solo amplitudes)
     dbc.Row([
-        dbc.Col(dcc.Interval(id="interval-component", interval=10*1000, n_intervals=0), width=12)
+        dbc.Col(dcc.Interval(id="interval-component", interval=INTERVALO_SONDEO, n_intervals=0, max_intervals=1), width=12),
+        WebSocket(id="ws", url=MALLA_WS_URL),
+        dcc.Store(id="malla-store")
     ]),
     
     # Sección de estado en formato JSON
@@ -73,77 +98,122 @@ app.layout = dbc.Container([
         dbc.Col(html.Div(id="estado-div"), width=12)
     ], className="my-3"),
     
-    # Sección para gráficos (barras y mapa de calor)
+    # Sección para gráficos (barras y mapa de calor), construidos en el navegador
     dbc.Row([
-        dbc.Col(html.Div(id="grafico-div"), width=12)
+        dbc.Col(html.Div(id="grafico-div", children=[
+            dcc.Graph(id="grafico-barras"),
+            dcc.Graph(id="grafico-calor")
+        ]), width=12)
     ], className="my-3")
 ], fluid=True)
 
-# Callback para actualizar el estado de la malla y mostrar el valor actual de lambda_foton
-@app.callback(
-    Output("estado-div", "children"),
-    [Input("interval-component", "n_intervals"),
-     Input("slider-lambda", "value")]
+def extraer_amplitudes(estado):
+    """
+    Reduce el estado de la malla a lo que necesitan los gráficos: la matriz de
+    amplitudes de la malla A y las amplitudes promedio calculadas por malla_watcher.
+    """
+    return {
+        "amp_A": estado.get("amp_A", []),
+        "promedio_A": estado.get("promedio_A", 0),
+        "promedio_B": estado.get("promedio_B", 0)
+    }
+
+# Desactiva el sondeo HTTP mientras el WebSocket esté abierto
+app.clientside_callback(
+    """
+    function(state) {
+        return Boolean(state && state.readyState === 1);
+    }
+    """,
+    Output("interval-component", "disabled"),
+    Input("ws", "state")
 )
-def actualizar_estado(n_intervals, lambda_value):
-    estado = obtener_estado_malla()
-    if "error" in estado:
-        return html.Div("Error al obtener estado: " + estado["error"], style={"color": "red"})
-    # Se agrega el valor de lambda_foton recibido desde el slider
-    if "resonador" in estado:
-        estado["resonador"]["lambda_foton_actual"] = lambda_value
-    else:
-        estado["resonador"] = {"lambda_foton_actual": lambda_value}
-    return html.Pre(json.dumps(estado, indent=4), style={"backgroundColor": "#f8f9fa", "padding": "10px"})
 
-# Callback para actualizar los gráficos: gráfico de barras y mapa de calor
+# Callback de servidor: cada estado (empujado por WebSocket o sondeado) alimenta el JSON y el Store.
+# El intervalo se detiene al alcanzar max_intervals y solo se rearma al terminar este callback,
+# de modo que la siguiente consulta se programa después de la anterior y nunca se acumulan.
 @app.callback(
-    Output("grafico-div", "children"),
-    [Input("interval-component", "n_intervals"),
-     Input("dropdown-malla", "value")]
+    [Output("estado-div", "children"),
+     Output("malla-store", "data"),
+     Output("interval-component", "interval"),
+     Output("interval-component", "max_intervals"),
+     Output("ws", "url")],
+    [Input("ws", "message"),
+     Input("interval-component", "n_intervals"),
+     Input("slider-lambda", "value")],
+    [State("interval-component", "interval"),
+     State("ws", "state")]
 )
-def actualizar_grafico(n_intervals, malla_seleccionada):
-    estado = obtener_estado_malla()
+def actualizar_dashboard(mensaje, n_intervals, lambda_value, intervalo, ws_state):
+    # Un cambio del slider reutiliza el último mensaje solo si el WebSocket sigue abierto;
+    # si se cerró, usa el último estado conocido (empujado o sondeado). Se consulta el
+    # endpoint cuando dispara el intervalo o no hay ningún estado previo.
+    ws_abierto = bool(ws_state) and ws_state.get("readyState") == 1
+    if ctx.triggered_id == "ws" and mensaje:
+        estado = json.loads(mensaje["data"])
+        # El estado empujado pasa a ser el más reciente también para el respaldo
+        # (el ETag se conserva: corresponde al último sondeo HTTP)
+        ultimo_estado["estado"] = estado
+    elif mensaje and ctx.triggered_id == "slider-lambda" and ws_abierto:
+        estado = json.loads(mensaje["data"])
+    elif ctx.triggered_id == "slider-lambda" and ultimo_estado["estado"] is not None:
+        estado = ultimo_estado["estado"]
+    else:
+        estado = obtener_estado_malla()
+    siguiente = n_intervals + 1
     if not estado or "error" in estado:
-        return html.Div("No se pueden mostrar gráficos debido a un error.", style={"color": "red"})
-    
-    def avg_amplitude(malla):
-        total = 0
-        count = 0
-        for fila in malla:
-            for celda in fila:
-                total += celda.get("amplitude", 0)
-                count += 1
-        return total / count if count else 0
-    
-    # Preparar datos para el gráfico de barras
-    data_barras = []
-    if malla_seleccionada in ["malla_A", "ambas"]:
-        prom_A = avg_amplitude(estado.get("malla_A", []))
-        data_barras.append(go.Bar(x=["Malla A"], y=[prom_A], marker_color="blue"))
-    if malla_seleccionada in ["malla_B", "ambas"]:
-        prom_B = avg_amplitude(estado.get("malla_B", []))
-        data_barras.append(go.Bar(x=["Malla B"], y=[prom_B], marker_color="green"))
-    
-    grafico_barras = dcc.Graph(
-        figure=go.Figure(data=data_barras, layout=go.Layout(title="Amplitud Promedio"))
-    )
-    
-    # Preparar datos para el mapa de calor de la malla A (como ejemplo)
-    malla_A = estado.get("malla_A", [])
-    if malla_A:
-        # Convertir la malla en una matriz de amplitudes
-        amplitudes = [[celda.get("amplitude", 0) for celda in fila] for fila in malla_A]
-        grafico_calor = dcc.Graph(
-            figure=go.Figure(
-                data=go.Heatmap(z=amplitudes, colorscale="Viridis"),
-                layout=go.Layout(title="Mapa de Calor - Malla A")
-            )
+        error = estado.get("error", "") if estado else ""
+        # Backoff exponencial: espaciar las consultas mientras el backend falle
+        intervalo = min((intervalo or INTERVALO_SONDEO) * FACTOR_BACKOFF, INTERVALO_SONDEO_MAX)
+        return (
+            html.Div("Error al obtener estado: " + error, style={"color": "red"}),
+            {"error": error},
+            intervalo,
+            siguiente,
+            no_update
         )
-    else:
-        grafico_calor = html.Div("No hay datos para la malla A.")
+    # El backend volvió a responder al sondeo de respaldo: si el WebSocket quedó cerrado
+    # (readyState 3), se fuerza una reconexión cambiando su URL
+    ws_url = no_update
+    if ctx.triggered_id == "interval-component" and ws_state and ws_state.get("readyState") == 3:
+        ws_url = f"{MALLA_WS_URL}?reintento={n_intervals}"
+    amplitudes = extraer_amplitudes(estado)
+    # Se agrega el valor de lambda_foton recibido desde el slider (sin modificar el estado
+    # recibido, que puede reutilizarse en la siguiente consulta)
+    estado = {**estado, "resonador": {**estado.get("resonador", {}), "lambda_foton_actual": lambda_value}}
+    estado_pre = html.Pre(orjson.dumps(estado, option=orjson.OPT_INDENT_2).decode(), style={"backgroundColor": "#f8f9fa", "padding": "10px"})
+    return estado_pre, amplitudes, INTERVALO_SONDEO, siguiente, ws_url
 
-    return html.Div([grafico_barras, grafico_calor])
+# Callback en el navegador: arma el gráfico de barras y el mapa de calor desde el Store,
+# sin reconstruir figuras de Plotly en Python en cada intervalo
+app.clientside_callback(
+    """
+    function(data, seleccion) {
+        if (!data || data.error) {
+            const vacio = {data: [], layout: {title: {text: "No se pueden mostrar gráficos debido a un error."}}};
+            return [vacio, vacio];
+        }
+        const barras = [];
+        if (seleccion === "malla_A" || seleccion === "ambas") {
+            barras.push({type: "bar", x: ["Malla A"], y: [data.promedio_A], marker: {color: "blue"}});
+        }
+        if (seleccion === "malla_B" || seleccion === "ambas") {
+            barras.push({type: "bar", x: ["Malla B"], y: [data.promedio_B], marker: {color: "green"}});
+        }
+        const calor = data.amp_A.length
+            ? [{type: "heatmap", z: data.amp_A, colorscale: "Viridis"}]
+            : [];
+        return [
+            {data: barras, layout: {title: {text: "Amplitud Promedio"}}},
+            {data: calor, layout: {title: {text: calor.length ? "Mapa de Calor - Malla A" : "No hay datos para la malla A."}}}
+        ];
+    }
+    """,
+    [Output("grafico-barras", "figure"),
+     Output("grafico-calor", "figure")],
+    [Input("malla-store", "data"),
+     Input("dropdown-malla", "value")]
+)
 
 if __name__ == '__main__':
     app.run_server(debug=True, host='0.0.0.0', port=8050)
@@ -9,13 +9,21 @@ los módulos que modelan la transmisión de la señal en el sistema:
   partículas cargadas que neutralizan la energía excesiva.
 
 La malla se utiliza para representar el flujo de "energía" del código.
+El estado de las mallas se almacena como matrices NumPy (Structure-of-Arrays):
+amp_A, amp_B y q_A, de modo que cada ciclo se resuelve con operaciones vectorizadas.
 """
 
 import random
 import time
 import threading
-from flask import Flask, jsonify
+import gzip
+import orjson
+from flask import Flask, Response, request
+from flask_sock import Sock
+from simple_websocket import ConnectionClosed
 from enum import Enum
+import numpy as np
+from numba import config as numba_config, njit, prange
 import os  # Asegurar que la variable de entorno PORT funciona correctamente
 
 # -----------------------------------------------------------
@@ -29,6 +37,8 @@ class TipoOnda(Enum):
 # Clase Cell
 # -----------------------------------------------------------
 class Cell:
+    __slots__ = ("x", "y", "amplitude", "phase", "q")
+
     def __init__(self, x, y, amplitude=0.0, phase=0.0, q=0.0):
         self.x = x
         self.y = y
@@ -46,8 +56,8 @@ class Cell:
         }
     
     def __repr__(self):
-        return (f"Cell({self.x}, {self.y}, amplitude={self.amplitude:.2f}, "
-                f"phase={self.phase:.2f}, q={self.q:.2f})")
+        return "Cell(%d, %d, amplitude=%.2f, phase=%.2f, q=%.2f)" % (
+            self.x, self.y, self.amplitude, self.phase, self.q)
 
 # -----------------------------------------------------------
 # Clases PhosWave y Electron
@@ -59,13 +69,22 @@ class PhosWave:
         self.lambda_foton = lambda_foton
         self.tipo_onda = tipo_onda  # Simulación del tipo de onda del fotón
 
+    @property
+    def lambda_foton(self):
+        return self._lambda
+
+    @lambda_foton.setter
+    def lambda_foton(self, valor):
+        # El factor de longitud de onda solo cambia con lambda_foton: se calcula una vez aquí
+        self._lambda = valor
+        self._factor = 500.0 / valor if valor else 1.0
+
     def transmitir(self, celda_A, celda_B):
         """
         Simula la transmisión de onda entre celdas de la malla
         """
-        factor = 500.0 / self.lambda_foton
         modulador = 1 + celda_A.q
-        transmision = self.T * factor * celda_A.amplitude * modulador
+        transmision = self.T * self._factor * celda_A.amplitude * modulador
         celda_B.amplitude += transmision
         celda_A.amplitude *= self.R
 
@@ -80,11 +99,12 @@ class Electron:
         celda.amplitude -= self.coef_interaccion * celda.amplitude
 
 # -----------------------------------------------------------
-# Inicialización de mallas
+# Inicialización de mallas (fila = y, columna = x)
 # -----------------------------------------------------------
 filas, columnas = 5, 5
-malla_A = [[Cell(x, y, amplitude=1.0, q=0.1 * (x + y)) for x in range(columnas)] for y in range(filas)]
-malla_B = [[Cell(x, y) for x in range(columnas)] for y in range(filas)]
+amp_A = np.ones((filas, columnas))
+amp_B = np.zeros((filas, columnas))
+q_A = 0.1 * (np.arange(filas)[:, None] + np.arange(columnas))
 
 resonador = PhosWave()
 electron = Electron()
@@ -92,50 +112,246 @@ electron = Electron()
 # -----------------------------------------------------------
 # Funciones de actualización de la malla
 # -----------------------------------------------------------
+# El pool de TBB no sobrevive al fork del worker de gunicorn (el maestro se cuelga
+# al salir); workqueue sí, y basta porque solo el hilo del ciclo lanza el kernel.
+numba_config.THREADING_LAYER = "workqueue"
+
+# A partir de este número de celdas compensa repartir las filas entre hilos
+UMBRAL_PARALELO = 4096
+
+def crear_tick(forma):
+    """
+    Genera el kernel fusionado especializado para una forma de malla fija.
+    Las dimensiones quedan como constantes de compilación, de modo que en mallas
+    pequeñas LLVM desenrolla los bucles y vectoriza; solo las grandes usan prange.
+    """
+    n_filas, n_columnas = forma
+
+    @njit(parallel=n_filas * n_columnas >= UMBRAL_PARALELO, fastmath=True, nogil=True)
+    def _tick(amp_A, amp_B, q_A, T, R, factor, ke):
+        """
+        Kernel fusionado: cada celda se lee y escribe una sola vez por ciclo.
+        Se ejecuta sin el GIL, así que no bloquea a los hilos que atienden peticiones.
+        """
+        for i in prange(n_filas):
+            for j in range(n_columnas):
+                a = amp_A[i, j]
+                amp_B[i, j] = (amp_B[i, j] + T * factor * a * (1.0 + q_A[i, j])) * (1.0 - ke)
+                amp_A[i, j] = a * R
+
+    # Compilar al crearlo para no pagar el JIT dentro del ciclo del servidor
+    _tick(np.ones(forma), np.zeros(forma), np.zeros(forma), 0.0, 1.0, 1.0, 0.0)
+    return _tick
+
+_tick_malla = crear_tick(amp_A.shape)
+_forma_tick = amp_A.shape
+
 def actualizar_malla():
     """
-    Aplica la transmisión de onda y la interacción electrónica en la malla
+    Aplica la transmisión de onda y la interacción electrónica en la malla.
+    Equivale a PhosWave.transmitir + Electron.interactuar celda a celda,
+    resuelto sobre las matrices completas.
     """
-    for i in range(len(malla_A)):
-        for j in range(len(malla_A[i])):
-            resonador.transmitir(malla_A[i][j], malla_B[i][j])
-            electron.interactuar(malla_B[i][j])
+    global _tick_malla, _forma_tick
+    if amp_A.shape != _forma_tick:
+        _tick_malla = crear_tick(amp_A.shape)
+        _forma_tick = amp_A.shape
+    _tick_malla(amp_A, amp_B, q_A, resonador.T, resonador.R,
+                resonador._factor, electron.coef_interaccion)
+
+INTERVALO_ACTUALIZACION = 5.0  # Segundos entre actualizaciones de la malla
+_detener_ciclo = threading.Event()
+_hilo_ciclo = None
 
-def ciclo_actualizacion():
+def ciclo_actualizacion(intervalo=INTERVALO_ACTUALIZACION):
     """
-    Inicia la actualización periódica de la malla.
+    Actualiza la malla a ritmo fijo y empuja cada nuevo estado a los clientes
+    WebSocket conectados, hasta que se llame a detener_ciclo().
+    Los ciclos se programan con el reloj monotónico; si uno se retrasa, los vencidos
+    se agrupan en una sola actualización en lugar de ejecutarse en ráfaga.
     """
-    while True:
+    siguiente = time.monotonic()
+    while not _detener_ciclo.is_set():
         actualizar_malla()
-        time.sleep(5)
+        difundir_estado(serializar_estado())
+        siguiente = max(siguiente + intervalo, time.monotonic())
+        _detener_ciclo.wait(siguiente - time.monotonic())
 
-# Iniciar la actualización en segundo plano
-threading.Thread(target=ciclo_actualizacion, daemon=True).start()
+def iniciar_ciclo():
+    """
+    Lanza el ciclo de actualización en un hilo de fondo, salvo que ya esté en marcha
+    en este proceso (tras un fork el hilo heredado no sigue vivo y se lanza uno nuevo).
+    """
+    global _hilo_ciclo
+    if _hilo_ciclo is not None and _hilo_ciclo.is_alive():
+        return _hilo_ciclo
+    _detener_ciclo.clear()
+    _hilo_ciclo = threading.Thread(target=ciclo_actualizacion, daemon=True)
+    _hilo_ciclo.start()
+    return _hilo_ciclo
+
+def detener_ciclo():
+    """
+    Detiene el ciclo de actualización y espera a que termine el ciclo en curso.
+    """
+    _detener_ciclo.set()
+    if _hilo_ciclo is not None and _hilo_ciclo is not threading.current_thread():
+        _hilo_ciclo.join()
 
 # -----------------------------------------------------------
 # Servidor Flask para exponer los datos de la malla
 # -----------------------------------------------------------
 app = Flask(__name__)
+sock = Sock(app)
 
-@app.route("/api/malla", methods=["GET"])
-def obtener_malla():
+# Clientes WebSocket suscritos a /ws/malla
+clientes_ws = set()
+clientes_lock = threading.Lock()
+# Serializa los envíos: simple_websocket no protege send() entre hilos, y el alta de
+# un cliente (instantánea + registro) no debe intercalarse con una difusión
+_envio_lock = threading.Lock()
+
+# Estado serializado una vez por ciclo; /api/malla y /ws/malla lo sirven sin recodificar.
+# tick_id crece con cada publicación y, junto al identificador de arranque (para que
+# un ETag de una ejecución anterior no coincida tras reiniciar), forma el ETag de /api/malla.
+_cache_lock = threading.Lock()
+_cache_bytes = b"{}"
+_cache_gzip = gzip.compress(_cache_bytes, compresslevel=1)
+tick_id = 0
+_arranque = format(time.time_ns(), "x")
+
+def estado_malla():
     """
-    Retorna el estado actual de la malla en formato JSON
+    Construye el diccionario con el estado actual de la malla.
+    Las matrices se envían tal cual (fila = y, columna = x), sin un dict por celda.
     """
-    return jsonify({
+    return {
         "status": "success",
-        "malla_A": [[celda.to_dict() for celda in fila] for fila in malla_A],
-        "malla_B": [[celda.to_dict() for celda in fila] for fila in malla_B],
+        "amp_A": amp_A,
+        "amp_B": amp_B,
+        "q_A": q_A,
+        "promedio_A": float(np.mean(amp_A)),
+        "promedio_B": float(np.mean(amp_B)),
         "resonador": {
             "tipo_onda": "senoidal",
             "lambda_foton": resonador.lambda_foton,
             "T": resonador.T,
             "R": resonador.R
         }
-    })
+    }
+
+def serializar_estado():
+    """
+    Serializa el estado actual de la malla y lo publica en la caché compartida,
+    junto con su versión comprimida (se comprime una vez por ciclo, no por petición).
+    """
+    global _cache_bytes, _cache_gzip, tick_id
+    payload = orjson.dumps(estado_malla(), option=orjson.OPT_SERIALIZE_NUMPY)
+    payload_gz = gzip.compress(payload, compresslevel=1)
+    with _cache_lock:
+        _cache_bytes = payload
+        _cache_gzip = payload_gz
+        tick_id += 1
+    return payload
+
+def difundir_estado(payload):
+    """
+    Envía el estado serializado a todos los clientes WebSocket conectados.
+    """
+    with _envio_lock:
+        with clientes_lock:
+            clientes = list(clientes_ws)
+        if not clientes:
+            return
+        mensaje = payload.decode()
+        for ws in clientes:
+            try:
+                ws.send(mensaje)
+            except Exception:
+                with clientes_lock:
+                    clientes_ws.discard(ws)
+
+@app.route("/api/malla", methods=["GET"])
+def obtener_malla():
+    """
+    Retorna el estado actual de la malla en formato JSON.
+    Responde 304 sin cuerpo si el cliente ya tiene el estado del ciclo actual (If-None-Match)
+    y entrega la versión gzip si el cliente la acepta.
+    """
+    # Se mira la calidad: "gzip;q=0" rechaza gzip aunque lo nombre
+    comprimir = request.accept_encodings["gzip"] > 0
+    with _cache_lock:
+        data = _cache_gzip if comprimir else _cache_bytes
+        etag = f"{_arranque}-{tick_id}"
+    if comprimir:
+        etag += "-gz"  # Cada codificación es una representación distinta
+    # If-None-Match usa comparación débil: un proxy puede devolver el ETag como W/"..."
+    if request.if_none_match.contains_weak(etag):
+        resp = Response(status=304)
+    else:
+        # Los bytes ya serializados se entregan tal cual, con longitud conocida
+        resp = Response(data, mimetype="application/json", direct_passthrough=True)
+        resp.headers["Content-Length"] = str(len(data))
+        if comprimir:
+            resp.headers["Content-Encoding"] = "gzip"
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.set_etag(etag)
+    return resp
+
+@sock.route("/ws/malla")
+def ws_malla(ws):
+    """
+    Canal WebSocket: envía el estado actual al conectar y luego uno nuevo por cada
+    actualización de la malla, evitando que los clientes tengan que sondear /api/malla.
+    """
+    try:
+        # Instantánea y alta bajo el mismo lock que la difusión: el cliente no puede
+        # recibir un estado más nuevo antes que la instantánea ni dos envíos a la vez
+        with _envio_lock:
+            with _cache_lock:
+                data = _cache_bytes
+            ws.send(data.decode())
+            with clientes_lock:
+                clientes_ws.add(ws)
+        while True:
+            ws.receive()
+    except ConnectionClosed:
+        pass
+    finally:
+        with clientes_lock:
+            clientes_ws.discard(ws)
+
+# Publicar el estado inicial e iniciar la actualización en segundo plano. Como script,
+# el ciclo lo lanza el worker de gunicorn tras el fork (post_fork), no el maestro.
+serializar_estado()
+if __name__ != "__main__":
+    iniciar_ciclo()
 
 if __name__ == "__main__":
+    from gunicorn.app.base import BaseApplication
+
+    class ServidorMalla(BaseApplication):
+        """
+        Sirve la app con gunicorn: un único worker, porque la malla vive en la memoria
+        del proceso, con varios hilos para atender peticiones y WebSockets en paralelo.
+        """
+        def __init__(self, port):
+            self.port = port
+            super().__init__()
+
+        def load_config(self):
+            self.cfg.set("bind", f"0.0.0.0:{self.port}")
+            self.cfg.set("workers", 1)
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("threads", 8)
+            # El hilo del ciclo no sobrevive al fork: se lanza dentro del worker
+            self.cfg.set("post_fork", lambda server, worker: iniciar_ciclo())
+
+        def load(self):
+            return app
+
     port = int(os.getenv("PORT", 5000))  # Usa un puerto dinámico si está definido
     print(f"🚀 Iniciando servidor de Malla Watcher en http://localhost:{port}")
-    app.run(host="0.0.0.0", port=port, debug=False)
+    ServidorMalla(port).run()
 
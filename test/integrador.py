@@ -11,19 +11,28 @@ Puedes ejecutarlo manualmente o integrarlo en un proceso periódico.
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 import json
 
 # Define las URL de los endpoints
 WATCHERS_WAVE_CONFIG_URL = "http://localhost:5000/api/config"
 WATCHER_FOCUS_URL = "http://localhost:6000/api/focus"
 
+# Sesión HTTP compartida: reutiliza las conexiones keep-alive entre consultas
+SESSION = requests.Session()
+SESSION.mount(
+    "http://",
+    HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=1),
+)
+
 
 def obtener_config_watchers_wave(timeout=5):
     """
     Consulta el endpoint de watchers_wave y devuelve la configuración en formato JSON.
     """
     try:
-        response = requests.get(WATCHERS_WAVE_CONFIG_URL, timeout=timeout)
+        response = SESSION.get(WATCHERS_WAVE_CONFIG_URL, timeout=(2, timeout))
         response.raise_for_status()  # Lanza excepción si el código de estado HTTP no es 200
         return response.json()
     except Exception as e:
@@ -36,7 +45,7 @@ def obtener_estado_watcher_focus(timeout=5):
     Consulta el endpoint de watcher_focus y devuelve el estado en formato JSON.
     """
     try:
-        response = requests.get(WATCHER_FOCUS_URL, timeout=timeout)
+        response = SESSION.get(WATCHER_FOCUS_URL, timeout=(2, timeout))
         response.raise_for_status()
         return response.json()
     except Exception as e:
@@ -47,9 +56,13 @@ def obtener_estado_watcher_focus(timeout=5):
 def integrar_estados():
     """
     Combina la información obtenida de ambos endpoints en un solo diccionario.
+    Ambas consultas se lanzan en paralelo, así que la espera es la de la más lenta.
     """
-    config_wave = obtener_config_watchers_wave()
-    estado_focus = obtener_estado_watcher_focus()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futuro_wave = executor.submit(obtener_config_watchers_wave)
+        futuro_focus = executor.submit(obtener_estado_watcher_focus)
+        config_wave = futuro_wave.result()
+        estado_focus = futuro_focus.result()
     estado_global = {"watchers_wave": config_wave, "watcher_focus": estado_focus}
     return estado_global
 
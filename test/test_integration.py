@@ -26,15 +26,17 @@ def iniciar_servidor_malla():
     """
     Arranca el servidor malla_watcher.py en un proceso separado y espera hasta que
     el endpoint /api/malla responda (200 o 404), para luego ejecutar los tests.
+    Cede la sesión HTTP del sondeo para que los tests reutilicen su conexión.
     """
     process = subprocess.Popen(
         ["python", "modulo/malla_watcher.py"]
     )  # Ajusta la ruta según tu estructura
     timeout = 40
     start_time = time.time()
+    sess = requests.Session()
     while True:
         try:
-            r = requests.get(MALLA_ENDPOINT, timeout=2)
+            r = sess.get(MALLA_ENDPOINT, timeout=1)
             # Consideramos el servidor activo si responde 200 o 404 (ya que usamos un endpoint dummy)
             if r.status_code in (200, 404):
                 break
@@ -44,23 +46,30 @@ def iniciar_servidor_malla():
             raise TimeoutError(
                 "El servidor malla_watcher no se inició en el tiempo esperado."
             )
-        time.sleep(1)
-    yield
+        time.sleep(0.1)
+    yield sess
+    sess.close()
     process.terminate()
     process.wait()
 
 
 @pytest.fixture(scope="session")
-def estado_malla():
+def sesion(iniciar_servidor_malla):
+    """Sesión HTTP compartida con el fixture de arranque del servidor."""
+    return iniciar_servidor_malla
+
+
+@pytest.fixture(scope="session")
+def estado_malla(sesion):
     """Consulta el endpoint REST y devuelve la respuesta JSON."""
-    response = requests.get(MALLA_ENDPOINT, timeout=5)
+    response = sesion.get(MALLA_ENDPOINT, timeout=5)
     response.raise_for_status()
     return response.json()
 
 
-def test_endpoint_status():
+def test_endpoint_status(sesion):
     """Verifica que el endpoint /api/malla retorne un código HTTP 200."""
-    response = requests.get(MALLA_ENDPOINT, timeout=5)
+    response = sesion.get(MALLA_ENDPOINT, timeout=5)
     assert (
         response.status_code == 200
     ), f"Esperado status 200, obtenido {response.status_code}"
@@ -70,13 +79,13 @@ def test_estado_malla_structure(estado_malla):
     """
     Verifica que la respuesta tenga la estructura esperada:
       - Clave "status" con valor "success"
-      - Claves "malla_A" y "malla_B" con datos
+      - Claves "amp_A", "amp_B" y "q_A" con las matrices de la malla
       - Clave "resonador" con atributos como tipo_onda, lambda_foton, T y R
     """
     assert "status" in estado_malla, "Falta la clave 'status' en la respuesta"
     assert estado_malla["status"] == "success", "El estado no es 'success'"
 
-    for key in ["malla_A", "malla_B", "resonador"]:
+    for key in ["amp_A", "amp_B", "q_A", "resonador"]:
         assert key in estado_malla, f"Falta la clave '{key}' en la respuesta"
 
 
@@ -89,10 +98,10 @@ def test_resonador_atributos(estado_malla):
 
 def test_malla_celdas(estado_malla):
     """
-    Verifica que las mallas contengan al menos una celda y que cada celda tenga
-    las propiedades 'x', 'y', 'amplitude' y 'phase'.
+    Verifica que las matrices de la malla contengan al menos una fila, que todas
+    las filas tengan el mismo número de columnas y que los valores sean numéricos.
     """
-    for malla_key in ["malla_A", "malla_B"]:
+    for malla_key in ["amp_A", "amp_B", "q_A"]:
         malla = estado_malla[malla_key]
         assert (
             isinstance(malla, list) and len(malla) > 0
@@ -101,23 +110,26 @@ def test_malla_celdas(estado_malla):
         assert (
             isinstance(primera_fila, list) and len(primera_fila) > 0
         ), f"La {malla_key} debe tener filas no vacías."
-        celda = primera_fila[0]
-        for prop in ["x", "y", "amplitude", "phase"]:
-            assert prop in celda, f"La celda no contiene la propiedad '{prop}'"
+        assert all(
+            len(fila) == len(primera_fila) for fila in malla
+        ), f"La {malla_key} debe ser una matriz rectangular."
+        assert all(
+            isinstance(valor, (int, float)) for valor in primera_fila
+        ), f"La {malla_key} debe contener valores numéricos."
 
 
-def test_actualizacion_periodica():
+def test_actualizacion_periodica(sesion):
     """
     Verifica que tras dos consultas consecutivas con un breve lapso (por ejemplo, 10 segundos)
     se observe una actualización en el estado (por ejemplo, cambios en las amplitudes).
     """
-    estado1 = requests.get(MALLA_ENDPOINT, timeout=5).json()
+    estado1 = sesion.get(MALLA_ENDPOINT, timeout=5).json()
     time.sleep(10)
-    estado2 = requests.get(MALLA_ENDPOINT, timeout=5).json()
+    estado2 = sesion.get(MALLA_ENDPOINT, timeout=5).json()
     cambio_detectado = False
-    for fila1, fila2 in zip(estado1.get("malla_A", []), estado2.get("malla_A", [])):
-        for celda1, celda2 in zip(fila1, fila2):
-            if celda1.get("amplitude") != celda2.get("amplitude"):
+    for fila1, fila2 in zip(estado1.get("amp_A", []), estado2.get("amp_A", [])):
+        for amplitud1, amplitud2 in zip(fila1, fila2):
+            if amplitud1 != amplitud2:
                 cambio_detectado = True
                 break
         if cambio_detectado:
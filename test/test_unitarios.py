@@ -53,6 +53,20 @@ def test_watchers_local_input_vacio():
     ), "La función no manejó correctamente una entrada vacía"
 
 
+def test_ruta_ignorada_directorios_anidados():
+    """
+    Verifica que los directorios ignorados se filtren a cualquier profundidad.
+    """
+    from watchers.watchers_utils import ruta_ignorada
+
+    assert ruta_ignorada("/w/node_modules/index.js")
+    assert ruta_ignorada("/w/node_modules/pkg/lib/a.js")
+    assert ruta_ignorada("/w/.git/hooks/x.py")
+    assert ruta_ignorada("/w/src/__pycache__/m.cpython-311.pyc")
+    assert not ruta_ignorada("/w/src/node_modules_util.py")
+    assert not ruta_ignorada("/w/src/main.py")
+
+
 ##############################
 # Pruebas Unitarias: MÓDULO "watchers_wave"
 ##############################
@@ -79,6 +93,131 @@ def test_phoswave_transmision():
     assert celda_A.amplitude < 1.0, "La celda_A no redujo su amplitud"
 
 
+def test_actualizar_malla_equivale_a_celdas():
+    """
+    Verifica que el kernel de actualizar_malla reproduzca PhosWave.transmitir +
+    Electron.interactuar aplicados celda a celda.
+    """
+    import numpy as np
+    from modulo import malla_watcher as mw
+
+    # Detener el ciclo de fondo para que no modifique las matrices durante la prueba
+    mw.detener_ciclo()
+    try:
+        filas, columnas = mw.amp_A.shape
+        celdas_A = [
+            [Cell(x, y, amplitude=1.0, q=mw.q_A[y, x]) for x in range(columnas)]
+            for y in range(filas)
+        ]
+        celdas_B = [[Cell(x, y) for x in range(columnas)] for y in range(filas)]
+        mw.amp_A[:] = 1.0
+        mw.amp_B[:] = 0.0
+        for _ in range(4):
+            for fila_A, fila_B in zip(celdas_A, celdas_B):
+                for celda_A, celda_B in zip(fila_A, fila_B):
+                    mw.resonador.transmitir(celda_A, celda_B)
+                    mw.electron.interactuar(celda_B)
+            mw.actualizar_malla()
+            esperado_A = [[c.amplitude for c in fila] for fila in celdas_A]
+            esperado_B = [[c.amplitude for c in fila] for fila in celdas_B]
+            assert np.allclose(mw.amp_A, esperado_A), "amp_A difiere de las celdas"
+            assert np.allclose(mw.amp_B, esperado_B), "amp_B difiere de las celdas"
+    finally:
+        mw.iniciar_ciclo()
+
+
+def test_obtener_malla_gzip_segun_accept_encoding():
+    """
+    Verifica que /api/malla entregue gzip solo si el cliente lo acepta con calidad > 0,
+    con un ETag propio (sufijo -gz) para esa representación.
+    """
+    import gzip
+    from modulo import malla_watcher as mw
+
+    cliente = mw.app.test_client()
+    identidad = cliente.get("/api/malla", headers={"Accept-Encoding": "identity"})
+    assert identidad.status_code == 200
+    assert "Content-Encoding" not in identidad.headers
+    etag, _ = identidad.get_etag()
+    assert not etag.endswith("-gz")
+
+    comprimida = cliente.get("/api/malla", headers={"Accept-Encoding": "gzip"})
+    assert comprimida.headers["Content-Encoding"] == "gzip"
+    etag_gz, _ = comprimida.get_etag()
+    assert etag_gz.endswith("-gz")
+    assert gzip.decompress(comprimida.data)[:1] == b"{"
+
+    rechazada = cliente.get(
+        "/api/malla", headers={"Accept-Encoding": "gzip;q=0, identity"}
+    )
+    assert "Content-Encoding" not in rechazada.headers
+    assert rechazada.data[:1] == b"{"
+
+
+def test_obtener_malla_304_con_etag():
+    """
+    Verifica que /api/malla responda 304 sin cuerpo al reenviar el ETag recibido,
+    también en su forma débil (W/"...") que puede introducir un proxy.
+    """
+    from modulo import malla_watcher as mw
+
+    # Sin el ciclo de fondo el ETag no cambia entre las dos peticiones
+    mw.detener_ciclo()
+    try:
+        cliente = mw.app.test_client()
+        etag = cliente.get("/api/malla").headers["ETag"]
+        for enviado in (etag, "W/" + etag):
+            resp = cliente.get("/api/malla", headers={"If-None-Match": enviado})
+            assert resp.status_code == 304
+            assert resp.data == b""
+    finally:
+        mw.iniciar_ciclo()
+
+
+@pytest.mark.parametrize("umbral", [0.9, 0.5, 0.3])
+def test_eventos_analiticos_equivalen_a_rk4(umbral):
+    """
+    Verifica que la solución cerrada del oscilador subamortiguado genere los mismos
+    eventos (step, t, amplitude) que la integración RK4, con los parámetros de
+    run_simulation.
+    """
+    import numpy as np
+    from watchers_wave import watchers_wave as ww
+
+    parametros = (1.0, 0.0, 0.0, 1.0, 2.0, 0.2, 0.05, 200, umbral)
+    analiticos = ww._eventos_analiticos(*parametros)
+    integrados = ww._simulate_rk4(*parametros)
+    assert len(analiticos) > 0, "El umbral debe generar eventos"
+    assert np.array_equal(analiticos[:, 0], integrados[:, 0])
+    assert np.allclose(analiticos, integrados, atol=1e-5)
+
+
+def test_simulate_batch_equivale_a_simulate_rk4():
+    """
+    Verifica que el barrido en paralelo dé, para cada condición inicial, las mismas
+    filas de eventos que _simulate_rk4 aplicado a ella por separado.
+    """
+    import numpy as np
+    from watchers_wave import watchers_wave as ww
+
+    x0 = np.array([1.0, 0.5, -0.8, 1.5])
+    y0 = np.array([0.0, 0.4, 0.2, -1.0])
+    vx0 = np.array([0.0, 0.3, -0.5, 0.1])
+    vy0 = np.array([1.0, -0.2, 0.6, 0.0])
+    omega, c, dt, steps, umbral = 1.0, 3.0, 0.01, 500, 0.3
+    eventos, n_eventos = ww._simulate_batch(
+        x0, y0, vx0, vy0, omega, c, dt, steps, umbral
+    )
+    assert n_eventos.min() > 0, "Cada trayectoria debe generar eventos"
+    for i in range(len(x0)):
+        esperado = ww._simulate_rk4(
+            x0[i], y0[i], vx0[i], vy0[i], omega, c, dt, steps, umbral
+        )
+        assert np.array_equal(
+            eventos[i, : n_eventos[i]], esperado
+        ), f"La trayectoria {i} difiere de _simulate_rk4"
+
+
 ##############################
 # Pruebas Unitarias: MÓDULO "watcher_focus"
 ##############################
@@ -96,5 +235,42 @@ def test_some_focus_function():
     ), "El resultado debe ser un string o un dict"
 
 
+def test_simulate_ensemble_equivale_a_rk4_integrate():
+    """
+    Verifica que el integrador vectorial del conjunto dé, para cada trayectoria,
+    el mismo estado final que rk4_integrate aplicado a ella por separado.
+    """
+    import numpy as np
+    from watcher_focus.watcher_focus import MU0, rk4_integrate, simulate_ensemble
+
+    x0 = np.array([0.1, 0.5, -0.3, 1.2])
+    y0 = np.array([0.0, -0.2, 0.4, 0.7])
+    z0 = np.array([0.0, 0.3, -0.1, 0.9])
+    dt, nsteps = 0.01, 500
+    resultado = simulate_ensemble(x0, y0, z0, dt=dt, nsteps=nsteps, mu0=MU0)
+    for i in range(len(x0)):
+        s0 = np.array([x0[i], y0[i], z0[i]])
+        t, s = rk4_integrate(0.0, s0, dt, nsteps, MU0)
+        assert np.isclose(resultado["t"], t)
+        assert np.allclose(
+            [resultado["x"][i], resultado["y"][i], resultado["z"][i]], s
+        ), f"La trayectoria {i} difiere de rk4_integrate"
+
+
+@pytest.mark.parametrize("dt", [0.2, 0.03])
+def test_simulate_watcher_focus_termina_en_total_time(dt, monkeypatch):
+    """
+    Verifica que la simulación cubra exactamente total_time aunque dt no divida
+    el intervalo de reporte.
+    """
+    import numpy as np
+    from watcher_focus import watcher_focus as wf
+
+    monkeypatch.setattr(wf.time, "sleep", lambda segundos: None)
+    monkeypatch.setattr(wf, "estado_compartido", np.full(len(wf.CAMPOS_ESTADO), np.nan))
+    wf.simulate_watcher_focus(dt=dt, total_time=3.0)
+    assert np.isclose(wf.estado_compartido[wf.CAMPOS_ESTADO.index("t")], 3.0)
+
+
 if __name__ == "__main__":
     pytest.main()
@@ -11,7 +11,7 @@ Este módulo:
   - Calcula indicadores adicionales:
       • phase: el ángulo de la fase (atan2(y, x))
       • z_error: la desviación de z respecto a z_target
-  - Ejecuta la simulación en un hilo de fondo, actualizando un estado global.
+  - Ejecuta la simulación en un proceso aparte, publicando el estado en memoria compartida.
   - Consulta periódicamente el endpoint REST que expone el estado de la malla (definido en malla_watcher.py)
     para detectar áreas críticas y ajustar el enfoque o activar alertas.
   - Expone un endpoint Flask (/api/focus) para consultar el estado actual e indicadores.
@@ -20,12 +20,20 @@ Se incluye también una función dummy "some_focus_function" para facilitar las
 """
 
 import math
+import os
 import time
 import threading
+import multiprocessing
+from multiprocessing import shared_memory
 import logging
 import requests
+from requests.adapters import HTTPAdapter
 import json
-from flask import Flask, jsonify
+import orjson
+import numpy as np
+from flask import Flask, Response
+from numba import njit
+from waitress import serve
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s"
@@ -49,81 +57,219 @@ BETA = 0.1  # Factor de corrección para z
 THRESHOLD = 1.0  # Umbral para activar la corrección
 Z_TARGET = 0.0  # Valor objetivo para z
 
-# Estado global del oscilador extendido
-current_state = {
-    "t": 0.0,
-    "x": None,
-    "y": None,
-    "z": None,
-    "phase": None,
-    "z_error": None,
-}
+# Estado del oscilador extendido como vector de float64 (NaN = aún sin valor).
+# main() lo traslada a memoria compartida para que la simulación corra en otro proceso.
+CAMPOS_ESTADO = ("t", "x", "y", "z", "z_error")
+estado_compartido = np.full(len(CAMPOS_ESTADO), np.nan)
+estado_compartido[0] = 0.0
 
-state_lock = threading.Lock()
+state_lock = multiprocessing.Lock()
 
 
 # --- Simulación del oscilador extendido (RK4 en R^3) ---
-def derivatives(t, x, y, z, mu0=MU0):
-    mu = mu0 + K * z
+# Compilados con Numba; los parámetros del modelo se congelan como constantes.
+@njit(fastmath=True)
+def derivatives(t, s, mu0):
+    """
+    Campo vectorial del oscilador para el estado s = [x, y, z].
+    """
+    x, y, z = s[0], s[1], s[2]
+    return np.array(
+        [
+            y,
+            (mu0 + K * z) * (1.0 - x * x) * y - x,
+            -ALPHA * (z - Z_TARGET) + BETA * (math.fabs(x) + math.fabs(y) - THRESHOLD),
+        ]
+    )
+
+
+@njit(fastmath=True)
+def _rk4_paso(t, s, dt, h2, h6, mu0):
+    """Paso RK4 con los pesos h2 = dt/2 y h6 = dt/6 ya calculados."""
+    k1 = derivatives(t, s, mu0)
+    k2 = derivatives(t + h2, s + h2 * k1, mu0)
+    k3 = derivatives(t + h2, s + h2 * k2, mu0)
+    k4 = derivatives(t + dt, s + dt * k3, mu0)
+    return s + h6 * (k1 + 2 * k2 + 2 * k3 + k4)
+
+
+@njit(fastmath=True)
+def rk4_step(t, s, dt, mu0):
+    return _rk4_paso(t, s, dt, dt * 0.5, dt / 6.0, mu0)
+
+
+@njit(fastmath=True)
+def rk4_integrate(t, s, dt, nsteps, mu0):
+    """
+    Avanza nsteps pasos RK4 en una sola llamada compilada y devuelve (t, s).
+    Los pesos se calculan una vez y t se obtiene como t0 + i*dt, sin acumular deriva.
+    """
+    h2 = dt * 0.5
+    h6 = dt / 6.0
+    for i in range(nsteps):
+        s = _rk4_paso(t + i * dt, s, dt, h2, h6, mu0)
+    return t + nsteps * dt, s
+
+
+# Si se generó el módulo AOT (python watcher_focus/watcher_focus_aot.py), se usan sus
+# versiones precompiladas y se evita el JIT al arrancar. WATCHER_FOCUS_AOT=0 lo desactiva.
+if os.getenv("WATCHER_FOCUS_AOT", "1") != "0":
+    try:
+        from .watcher_focus_fast import rk4_step, rk4_integrate
+    except ImportError:
+        try:
+            from watcher_focus_fast import rk4_step, rk4_integrate
+        except ImportError:
+            pass  # Sin módulo AOT: se mantiene la compilación JIT
+
+
+# --- Conjunto de osciladores independientes (barridos de condiciones iniciales) ---
+@njit(fastmath=True)
+def derivatives_ensemble(t, x, y, z, mu0):
+    """
+    Campo vectorial evaluado elemento a elemento sobre arrays (N,) de x, y, z.
+    """
     dxdt = y
-    dydt = mu * (1 - x**2) * y - x
-    dzdt = -ALPHA * (z - Z_TARGET) + BETA * (abs(x) + abs(y) - THRESHOLD)
+    dydt = (mu0 + K * z) * (1.0 - x * x) * y - x
+    dzdt = -ALPHA * (z - Z_TARGET) + BETA * (np.abs(x) + np.abs(y) - THRESHOLD)
     return dxdt, dydt, dzdt
 
 
-def rk4_step(t, x, y, z, dt, mu0=MU0):
-    dx1, dy1, dz1 = derivatives(t, x, y, z, mu0)
-    x2 = x + dx1 * dt / 2
-    y2 = y + dy1 * dt / 2
-    z2 = z + dz1 * dt / 2
-    dx2, dy2, dz2 = derivatives(t + dt / 2, x2, y2, z2, mu0)
-    x3 = x + dx2 * dt / 2
-    y3 = y + dy2 * dt / 2
-    z3 = z + dz2 * dt / 2
-    dx3, dy3, dz3 = derivatives(t + dt / 2, x3, y3, z3, mu0)
-    x4 = x + dx3 * dt
-    y4 = y + dy3 * dt
-    z4 = z + dz3 * dt
-    dx4, dy4, dz4 = derivatives(t + dt, x4, y4, z4, mu0)
-    x_new = x + (dt / 6) * (dx1 + 2 * dx2 + 2 * dx3 + dx4)
-    y_new = y + (dt / 6) * (dy1 + 2 * dy2 + 2 * dy3 + dy4)
-    z_new = z + (dt / 6) * (dz1 + 2 * dz2 + 2 * dz3 + dz4)
+@njit(fastmath=True)
+def rk4_step_ensemble(t, x, y, z, dt, mu0):
+    dx1, dy1, dz1 = derivatives_ensemble(t, x, y, z, mu0)
+    h = dt * 0.5
+    h6 = dt / 6.0
+    dx2, dy2, dz2 = derivatives_ensemble(
+        t + h, x + h * dx1, y + h * dy1, z + h * dz1, mu0
+    )
+    dx3, dy3, dz3 = derivatives_ensemble(
+        t + h, x + h * dx2, y + h * dy2, z + h * dz2, mu0
+    )
+    dx4, dy4, dz4 = derivatives_ensemble(
+        t + dt, x + dt * dx3, y + dt * dy3, z + dt * dz3, mu0
+    )
+    x_new = x + h6 * (dx1 + 2 * dx2 + 2 * dx3 + dx4)
+    y_new = y + h6 * (dy1 + 2 * dy2 + 2 * dy3 + dy4)
+    z_new = z + h6 * (dz1 + 2 * dz2 + 2 * dz3 + dz4)
     return x_new, y_new, z_new
 
 
+@njit(fastmath=True)
+def rk4_integrate_ensemble(t, x, y, z, dt, nsteps, mu0):
+    for i in range(nsteps):
+        x, y, z = rk4_step_ensemble(t + i * dt, x, y, z, dt, mu0)
+    return t + nsteps * dt, x, y, z
+
+
+def simulate_ensemble(x0, y0, z0, dt=0.01, nsteps=3000, mu0=MU0):
+    """
+    Integra N trayectorias a la vez (x0, y0, z0 son arrays de longitud N): cada etapa
+    RK4 es una operación vectorial sobre las N. Devuelve los indicadores finales.
+    """
+    x = np.asarray(x0, dtype=np.float64)
+    y = np.asarray(y0, dtype=np.float64)
+    z = np.asarray(z0, dtype=np.float64)
+    t, x, y, z = rk4_integrate_ensemble(0.0, x, y, z, dt, nsteps, mu0)
+    return {
+        "t": t,
+        "x": x,
+        "y": y,
+        "z": z,
+        "phase": np.arctan2(y, x),
+        "z_error": np.abs(z - Z_TARGET),
+    }
+
+
 def update_indicators(t, x, y, z):
-    phase = math.atan2(y, x)
+    # La fase no se calcula aquí: get_focus la deriva de (x, y) solo al consultarla
     z_error = abs(z - Z_TARGET)
-    return {"t": t, "x": x, "y": y, "z": z, "phase": phase, "z_error": z_error}
+    return {"t": t, "x": x, "y": y, "z": z, "z_error": z_error}
+
+
+INTERVALO_REPORTE = 0.1  # Segundos entre publicaciones del estado
 
 
 def simulate_watcher_focus(dt=0.01, total_time=30.0):
     logging.info("Iniciando simulación de watcher_focus (oscilador extendido en R^3).")
     t = 0.0
-    x, y, z = 1.0, 0.0, 0.5  # Condiciones iniciales
-    while t < total_time:
-        x, y, z = rk4_step(t, x, y, z, dt)
-        t += dt
-        if int(t * 100) % 10 == 0:
-            indicators = update_indicators(t, x, y, z)
-            with state_lock:
-                current_state.update(indicators)
-            logging.info(
-                f"t={t:.2f} | x={x:.3f} | y={y:.3f} | z={z:.3f} | phase={indicators['phase']:.3f} | z_error={indicators['z_error']:.3f}"
-            )
-        time.sleep(dt)
+    s = np.array([1.0, 0.0, 0.5])  # Condiciones iniciales [x, y, z]
+    pasos_por_reporte = max(1, int(round(INTERVALO_REPORTE / dt)))
+    total_pasos = int(round(total_time / dt))
+    hechos = 0
+    inicio = time.monotonic()
+    while hechos < total_pasos:
+        # Integra de un punto de reporte al siguiente en código nativo; el último
+        # tramo se recorta para terminar exactamente en total_time
+        pasos = min(pasos_por_reporte, total_pasos - hechos)
+        t, s = rk4_integrate(hechos * dt, s, dt, pasos, MU0)
+        hechos += pasos
+        x, y, z = (float(v) for v in s)
+        indicators = update_indicators(t, x, y, z)
+        with state_lock:
+            estado_compartido[:] = [indicators[c] for c in CAMPOS_ESTADO]
+        logging.info(
+            f"t={t:.2f} | x={x:.3f} | y={y:.3f} | z={z:.3f} | z_error={indicators['z_error']:.3f}"
+        )
+        # Una sola espera por reporte, anclada al reloj para no acumular deriva
+        objetivo = inicio + hechos * dt
+        time.sleep(max(0.0, objetivo - time.monotonic()))
     logging.info("Simulación de watcher_focus completada.")
 
 
+def proceso_simulacion(nombre_memoria, lock, dt=0.01, total_time=30.0):
+    """
+    Punto de entrada del proceso de simulación: publica en la memoria compartida
+    creada por main(), de modo que el integrador no compite por el GIL con la API.
+    """
+    global estado_compartido, state_lock
+    memoria = shared_memory.SharedMemory(name=nombre_memoria)
+    estado_compartido = np.ndarray(
+        (len(CAMPOS_ESTADO),), dtype=np.float64, buffer=memoria.buf
+    )
+    state_lock = lock
+    try:
+        simulate_watcher_focus(dt=dt, total_time=total_time)
+    finally:
+        estado_compartido = estado_compartido.copy()  # Suelta la vista antes de cerrar
+        memoria.close()
+
+
 # --- Consulta al endpoint REST de la malla ---
 MALLA_ENDPOINT = "http://localhost:5000/api/malla"
 
+# Sesión HTTP compartida: reutiliza la conexión keep-alive con malla_watcher
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
+
+# ETag de la última respuesta y espera pedida por el servidor (Retry-After)
+ultimo_estado_malla = {"etag": None, "espera": 0.0}
+SIN_CAMBIOS = object()  # La malla no cambió desde la consulta anterior (304)
+
 
 def obtener_estado_malla(timeout=5):
+    """
+    Consulta condicional de la malla: devuelve el estado, SIN_CAMBIOS si el servidor
+    responde 304 (sin descargar ni parsear el cuerpo) o None si la consulta falla.
+    """
+    headers = {}
+    if ultimo_estado_malla["etag"]:
+        headers["If-None-Match"] = ultimo_estado_malla["etag"]
     try:
-        response = requests.get(MALLA_ENDPOINT, timeout=timeout)
+        response = SESSION.get(MALLA_ENDPOINT, headers=headers, timeout=timeout)
+        ultimo_estado_malla["espera"] = 0.0
+        if response.status_code in (429, 503):
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                ultimo_estado_malla["espera"] = float(retry_after)
+        if response.status_code == 304:
+            return SIN_CAMBIOS
         response.raise_for_status()
-        return response.json()
+        # El payload ya es una matriz compacta de amplitudes: orjson la parsea en un paso
+        estado = orjson.loads(response.content)
+        ultimo_estado_malla["etag"] = response.headers.get("ETag")
+        return estado
     except Exception as e:
         logging.error(f"Error al obtener el estado de la malla: {e}")
         return None
@@ -131,15 +277,19 @@ def obtener_estado_malla(timeout=5):
 
 def actualizar_estado_watcher_focus():
     estado = obtener_estado_malla()
-    if estado:
-        celdas_criticas = []
-        for fila in estado.get("malla_A", []):
-            for celda in fila:
-                if celda.get("amplitude", 0) > 1.5:
-                    celdas_criticas.append(celda)
-        logging.info(
-            "Celdas críticas detectadas:\n" + json.dumps(celdas_criticas, indent=4)
-        )
+    if estado is SIN_CAMBIOS:
+        logging.debug("La malla no ha cambiado desde la última consulta.")
+    elif estado:
+        # Un único barrido vectorizado sobre la matriz (fila = y, columna = x)
+        amps = np.asarray(estado.get("amp_A", []), dtype=np.float64)
+        indices = np.argwhere(amps > 1.5)
+        logging.info(f"Celdas críticas detectadas: {len(indices)}")
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            celdas_criticas = [
+                {"x": int(x), "y": int(y), "amplitude": float(amps[y, x])}
+                for y, x in indices
+            ]
+            logging.debug(json.dumps(celdas_criticas, indent=4))
     else:
         logging.warning("No se pudo obtener el estado de la malla.")
 
@@ -147,7 +297,8 @@ def actualizar_estado_watcher_focus():
 def ciclo_watcher_focus(intervalo=10):
     while True:
         actualizar_estado_watcher_focus()
-        time.sleep(intervalo)
+        # Si el servidor pidió más margen (Retry-After), se respeta
+        time.sleep(max(intervalo, ultimo_estado_malla["espera"]))
 
 
 # --- API con Flask para exponer el estado Focus ---
@@ -157,22 +308,41 @@ app_focus = Flask(__name__)
 @app_focus.route("/api/focus", methods=["GET"])
 def get_focus():
     with state_lock:
-        state_copy = current_state.copy()
-    return jsonify({"status": "success", "focus_state": state_copy}), 200
+        valores = estado_compartido.copy()
+    state_copy = {
+        campo: None if math.isnan(valor) else float(valor)
+        for campo, valor in zip(CAMPOS_ESTADO, valores)
+    }
+    state_copy["phase"] = None
+    if state_copy["x"] is not None:
+        state_copy["phase"] = math.atan2(state_copy["y"], state_copy["x"])
+    return Response(
+        orjson.dumps({"status": "success", "focus_state": state_copy}),
+        status=200,
+        mimetype="application/json",
+    )
 
 
 def run_focus_api():
-    app_focus.run(host="0.0.0.0", port=6000)
+    # Servidor WSGI de producción: varios hilos atienden /api/focus sin frenar la simulación
+    serve(app_focus, host="0.0.0.0", port=6000, threads=4)
 
 
 # --- Programa Principal ---
 def main():
-    # Inicia la simulación en un hilo de fondo
-    sim_thread = threading.Thread(
-        target=simulate_watcher_focus, kwargs={"dt": 0.01, "total_time": 30.0}
+    global estado_compartido
+    # Traslada el estado a memoria compartida e inicia la simulación en otro proceso
+    memoria = shared_memory.SharedMemory(create=True, size=estado_compartido.nbytes)
+    vista = np.ndarray(estado_compartido.shape, dtype=np.float64, buffer=memoria.buf)
+    vista[:] = estado_compartido
+    estado_compartido = vista
+    sim_process = multiprocessing.Process(
+        target=proceso_simulacion,
+        args=(memoria.name, state_lock),
+        kwargs={"dt": 0.01, "total_time": 30.0},
+        daemon=True,
     )
-    sim_thread.daemon = True
-    sim_thread.start()
+    sim_process.start()
     # Inicia la API Flask para exponer el estado de focus
     api_thread = threading.Thread(target=run_focus_api)
     api_thread.daemon = True
@@ -181,7 +351,14 @@ def main():
     malla_thread = threading.Thread(target=ciclo_watcher_focus, args=(10,))
     malla_thread.daemon = True
     malla_thread.start()
-    sim_thread.join()
+    try:
+        sim_process.join()
+    finally:
+        with state_lock:
+            estado_compartido = estado_compartido.copy()
+        del vista
+        memoria.close()
+        memoria.unlink()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+watcher_focus_aot: Compilación anticipada (AOT) del integrador RK4 de watcher_focus.
+
+Genera la extensión nativa watcher_focus_fast junto a este archivo, con las mismas
+funciones rk4_step y rk4_integrate, para que watcher_focus no pague el JIT de Numba
+al arrancar. Ejecutar en el paso de build:
+
+    python watcher_focus/watcher_focus_aot.py
+
+Si la extensión no existe, watcher_focus sigue funcionando con la versión JIT.
+"""
+
+import os
+import sys
+
+# Importar las versiones JIT originales, no una extensión generada anteriormente
+os.environ["WATCHER_FOCUS_AOT"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from numba.pycc import CC
+import watcher_focus
+
+cc = CC("watcher_focus_fast")
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+@cc.export("rk4_step", "f8[::1](f8, f8[::1], f8, f8)")
+def rk4_step(t, s, dt, mu0):
+    return watcher_focus.rk4_step(t, s, dt, mu0)
+
+
+@cc.export("rk4_integrate", "Tuple((f8, f8[::1]))(f8, f8[::1], f8, i8, f8)")
+def rk4_integrate(t, s, dt, nsteps, mu0):
+    return watcher_focus.rk4_integrate(t, s, dt, nsteps, mu0)
+
+
+if __name__ == "__main__":
+    cc.compile()
@@ -7,19 +7,30 @@ usando procesamiento local o en la nube.
 import os
 import sys
 import time
-import hashlib
+import xxhash
 import logging
 import threading
+from collections import OrderedDict
 from pathlib import Path
 from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
+from watchdog.events import PatternMatchingEventHandler
 import watchers_local  # Módulo para procesamiento local
 import watchers_cloud  # Módulo para procesamiento en la nube
 from watchers_comm import load_local_config, run_config_updater, send_event, send_error
+from watchers_utils import ruta_ignorada
 
 # Configuración general: se lee el umbral desde la variable de entorno, con valor por defecto 50
 MAX_LINES_LOCAL = int(os.getenv("MAX_LINES_LOCAL", 50))
 DEBOUNCE_TIME = 1.0  # Segundos entre procesamientos consecutivos del mismo archivo
+# Filtros aplicados por watchdog antes de llegar al manejador: se vigila cualquier
+# tipo de archivo y solo se descartan los temporales.
+# Los directorios ignorados (.git, node_modules...) se filtran en ChangeHandler.dispatch
+PATRONES_IGNORADOS = [
+    "*.swp",
+    "*.tmp",
+    "*~",
+]
+MAX_ARCHIVOS_REGISTRADOS = 4096  # Archivos recordados (se descarta el menos reciente)
 
 # Configurar logging: nivel DEBUG para ver detalles de depuración y mensajes INFO para lo esencial.
 logging.basicConfig(
@@ -29,72 +40,81 @@ logging.basicConfig(
 )
 
 
-class ChangeHandler(FileSystemEventHandler):
+class ChangeHandler(PatternMatchingEventHandler):
     """Manejador de eventos con debounce, control de cambios reales y thread safety."""
 
     def __init__(self):
-        super().__init__()
-        self.last_processed = (
-            {}
-        )  # Almacena el último tiempo de procesamiento por archivo
-        self.file_hashes = (
-            {}
-        )  # Almacena el hash MD5 del contenido previo de cada archivo
+        super().__init__(
+            patterns=None,
+            ignore_patterns=PATRONES_IGNORADOS,
+            ignore_directories=True,
+        )
+        # Por archivo: (último procesamiento, tamaño, mtime_ns, hash xxh3), en orden LRU
+        self.archivos = OrderedDict()
         self.lock = (
             threading.Lock()
-        )  # Lock para garantizar acceso thread-safe a los diccionarios
+        )  # Lock para garantizar acceso thread-safe al registro de archivos
 
-    def on_modified(self, event):
-        """Maneja modificaciones de archivos con verificación de cambios reales."""
-        if event.is_directory:
+    def dispatch(self, event):
+        """Descarta los eventos de directorios ignorados antes de aplicar los patrones."""
+        if ruta_ignorada(event.src_path):
             return
+        super().dispatch(event)
 
-        filepath = Path(event.src_path)
+    def on_modified(self, event):
+        """Maneja modificaciones de archivos con verificación de cambios reales."""
+        # La ruta se usa como str: como clave se hashea más rápido que un Path
+        filepath = os.fspath(event.src_path)
         current_time = time.time()
 
-        # Verificar debounce de forma thread-safe
+        # Instantánea del registro: única lectura bajo el lock
         with self.lock:
-            if self._recently_processed(filepath, current_time):
-                logging.debug(f"Omitiendo {filepath} por debounce.")
-                return
+            previo = self.archivos.get(filepath)
 
-        # Leer el contenido del archivo (fuera de la sección crítica para evitar bloqueos prolongados)
+        if previo is not None and current_time - previo[0] < DEBOUNCE_TIME:
+            logging.debug(f"Omitiendo {filepath} por debounce.")
+            return
+
+        # Leer y hashear fuera de la sección crítica, solo si cambió tamaño o fecha
         try:
-            with open(filepath, "r", encoding="utf-8") as f:
-                content = f.read()
+            with open(filepath, "rb") as f:
+                stat = os.fstat(f.fileno())
+                firma = (stat.st_size, stat.st_mtime_ns)
+                if previo is not None and previo[1:3] == firma:
+                    logging.debug(f"No hay cambio en el contenido de {filepath}.")
+                    return
+                data = f.read()
         except Exception as e:
             logging.error(f"Error leyendo {filepath}: {e}")
             send_error("FILE_READ_ERROR", f"Error leyendo {filepath}: {e}")
             return
+        content_hash = xxhash.xxh3_64_intdigest(data)
+        cambiado = previo is None or previo[3] != content_hash
 
-        # Verificar si el contenido ha cambiado, de forma thread-safe
+        # Compare-and-set: si otro hilo registró el archivo entretanto, gana ese hilo
         with self.lock:
-            if not self._content_changed(filepath, content):
-                logging.debug(f"No hay cambio en el contenido de {filepath}.")
+            if self.archivos.get(filepath) is not previo:
+                logging.debug(f"{filepath} ya fue registrado por otro evento.")
                 return
-            # Actualiza el tiempo de último procesamiento
-            self.last_processed[filepath] = current_time
+            ultimo = current_time if cambiado else previo[0]
+            self.archivos[filepath] = (ultimo, *firma, content_hash)
+            self.archivos.move_to_end(filepath)
+            while len(self.archivos) > MAX_ARCHIVOS_REGISTRADOS:
+                self.archivos.popitem(last=False)
+
+        if not cambiado:
+            logging.debug(f"No hay cambio en el contenido de {filepath}.")
+            return
 
         # Procesar el archivo (fuera del lock)
-        self._process_file(filepath, content)
-
-    def _recently_processed(self, filepath, current_time):
-        """Verifica si el archivo fue procesado recientemente."""
-        last_time = self.last_processed.get(filepath, 0)
-        return (current_time - last_time) < DEBOUNCE_TIME
-
-    def _content_changed(self, filepath, content):
-        """Verifica si el contenido ha cambiado usando hash MD5."""
-        content_hash = hashlib.md5(content.encode()).hexdigest()
-        if self.file_hashes.get(filepath) == content_hash:
-            return False
-        self.file_hashes[filepath] = content_hash
-        return True
-
-    def _process_file(self, filepath, content):
+        self._process_file(filepath, data)
+
+    def _process_file(self, filepath, data):
         """Ejecuta el procesamiento del archivo según su tamaño."""
-        num_lines = content.count("\n") + 1
+        # Las líneas se cuentan sobre los bytes, sin decodificar
+        num_lines = data.count(b"\n") + 1
         logging.info(f"Procesando: {filepath} ({num_lines} líneas)")
+        content = data.decode("utf-8", errors="replace")
 
         if num_lines <= MAX_LINES_LOCAL:
             logging.debug("Usando agente local.")
@@ -1,7 +1,8 @@
 import requests
+from requests.adapters import HTTPAdapter
 import uuid
-import datetime
 import json
+import orjson
 import time
 import threading
 import logging
@@ -21,6 +22,23 @@ WATCHERS_CONFIG = {
     },
 }
 
+# Sesión HTTP compartida: reutiliza las conexiones keep-alive con watchers_wave
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+FORMATO_TIMESTAMP = "%Y-%m-%dT%H:%M:%S"
+
+
+def _timestamp_utc():
+    """Marca de tiempo ISO 8601 en UTC con microsegundos, sin crear objetos datetime."""
+    segundos, nanos = divmod(time.time_ns(), 1_000_000_000)
+    return "%s.%06dZ" % (
+        time.strftime(FORMATO_TIMESTAMP, time.gmtime(segundos)),
+        nanos // 1000,
+    )
+
 
 def load_local_config(config_file="config.yaml"):
     try:
@@ -49,14 +67,16 @@ def send_event(file_path, suggestions):
         + WATCHERS_CONFIG["endpoints"]["event"]
     )
     event_data = {
-        "event_id": str(uuid.uuid4()),
-        "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+        "event_id": uuid.uuid4().hex,
+        "timestamp": _timestamp_utc(),
         "file_path": file_path,
         "suggestions": suggestions,
         "additional_data": {},
     }
     try:
-        response = requests.post(url, json=event_data, timeout=5)
+        response = SESSION.post(
+            url, data=orjson.dumps(event_data), headers=JSON_HEADERS, timeout=5
+        )
         if response.status_code == 200:
             logging.info(f"Evento enviado exitosamente: {event_data['event_id']}")
         else:
@@ -73,14 +93,16 @@ def send_error(error_code, description, additional_data=None):
         + WATCHERS_CONFIG["endpoints"]["error"]
     )
     error_data = {
-        "error_id": str(uuid.uuid4()),
-        "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+        "error_id": uuid.uuid4().hex,
+        "timestamp": _timestamp_utc(),
         "error_code": error_code,
         "description": description,
         "additional_data": additional_data or {},
     }
     try:
-        response = requests.post(url, json=error_data, timeout=5)
+        response = SESSION.post(
+            url, data=orjson.dumps(error_data), headers=JSON_HEADERS, timeout=5
+        )
         if response.status_code == 200:
             logging.info(
                 f"Reporte de error enviado exitosamente: {error_data['error_id']}"
@@ -98,10 +120,15 @@ def update_config_periodically(interval=60):
         WATCHERS_CONFIG["watchers_wave_base_url"]
         + WATCHERS_CONFIG["endpoints"]["config"]
     )
+    etag = None
     while True:
         try:
-            response = requests.get(url, timeout=5)
-            if response.status_code == 200:
+            headers = {"If-None-Match": etag} if etag else {}
+            response = SESSION.get(url, headers=headers, timeout=5)
+            if response.status_code == 304:
+                logging.debug("La configuración no ha cambiado.")
+            elif response.status_code == 200:
+                etag = response.headers.get("ETag")
                 config_json = response.json()
                 if config_json.get("status") == "success":
                     new_config = config_json.get("config", {})
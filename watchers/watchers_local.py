@@ -1,3 +1,4 @@
+import re
 import subprocess
 import logging
 from pathlib import Path
@@ -19,6 +20,9 @@ PLACEHOLDER_RULES = {
     "python": "Revisa PEP-8 y posibles anti-patrones.",
 }
 
+# Un único escáner sin distinción de mayúsculas para todos los patrones
+_RULE_RE = re.compile("|".join(map(re.escape, PLACEHOLDER_RULES)), re.IGNORECASE)
+
 
 def get_suggestions_local(code_snippet: str) -> str:
     """
@@ -39,9 +43,10 @@ def _generate_placeholder_suggestion(code: str) -> str:
     """
     Genera sugerencias simuladas basadas en patrones en el código.
     """
-    code_lower = code.strip().lower()
+    encontrados = {m.group(0).lower() for m in _RULE_RE.finditer(code)}
+    # Se respeta la prioridad de las reglas, no la posición del patrón en el código
     for pattern, suggestion in PLACEHOLDER_RULES.items():
-        if pattern in code_lower:
+        if pattern in encontrados:
             return f"{PLACEHOLDER_PREFIX}{suggestion}"
     return f"{PLACEHOLDER_PREFIX}{DEFAULT_SUGGESTION}"
 
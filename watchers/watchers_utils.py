@@ -0,0 +1,15 @@
+"""
+Utilidades compartidas por los watchers.
+"""
+
+import os
+
+# Directorios cuyo contenido nunca se procesa, a cualquier profundidad.
+# Los patrones de watchdog (PurePath.match) no son recursivos, así que estos
+# se comprueban aparte sobre los componentes de la ruta.
+DIRECTORIOS_IGNORADOS = frozenset({".git", "__pycache__", "node_modules"})
+
+
+def ruta_ignorada(ruta):
+    """Indica si la ruta está dentro de alguno de los DIRECTORIOS_IGNORADOS."""
+    return not DIRECTORIOS_IGNORADOS.isdisjoint(os.fspath(ruta).split(os.sep))
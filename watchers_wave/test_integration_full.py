@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import os
+import select
 import tempfile
 import time
 import subprocess
@@ -10,6 +11,51 @@ WATCHERS_SCRIPT = "/home/gerardo/Documentos/Proyectos/watchers/watchers/main.py"
 WATCHERS_WAVE_SCRIPT = (
     "/home/gerardo/Documentos/Proyectos/watchers_wave/watchers_wave.py"
 )
+WATCHERS_WAVE_CONFIG_URL = "http://localhost:5000/api/config"
+
+
+def wait_ready(url, timeout=30):
+    """Sondea la URL hasta que responda, en lugar de dormir un tiempo fijo."""
+    t0 = time.monotonic()
+    while time.monotonic() - t0 < timeout:
+        try:
+            requests.get(url, timeout=0.3)
+            return True
+        except requests.RequestException:
+            time.sleep(0.1)
+    return False
+
+
+# Salida de stderr ya leída pero aún no consumida por wait_output, por pid
+_pendiente = {}
+
+
+def wait_output(proc, texto, timeout=30):
+    """
+    Lee el stderr del proceso (donde escribe logging) hasta ver el texto indicado.
+    Se lee del descriptor con os.read: con readline() las líneas que quedan en el
+    buffer de Python no las ve select() y la espera llegaría al timeout.
+    """
+    fd = proc.stderr.fileno()
+    objetivo = texto.encode("utf-8")
+    buffer = _pendiente.pop(proc.pid, b"")
+    t0 = time.monotonic()
+    while True:
+        pos = buffer.find(objetivo)
+        if pos >= 0:
+            _pendiente[proc.pid] = buffer[pos + len(objetivo) :]
+            return True
+        restante = timeout - (time.monotonic() - t0)
+        if restante <= 0:
+            break
+        listo, _, _ = select.select([fd], [], [], min(restante, 0.1))
+        if listo:
+            bloque = os.read(fd, 65536)
+            if not bloque:
+                break  # El proceso terminó
+            buffer += bloque
+    _pendiente[proc.pid] = buffer
+    return False
 
 
 def run_integration_test():
@@ -24,8 +70,9 @@ def run_integration_test():
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
         )
-        # Esperar a que watchers_wave inicie completamente (por ejemplo, 5 segundos)
-        time.sleep(5)
+        # Esperar a que watchers_wave responda en /api/config
+        if not wait_ready(WATCHERS_WAVE_CONFIG_URL):
+            print("watchers_wave no respondió a tiempo.")
 
         # 3. Iniciar watchers, indicándole que monitorice el directorio temporal
         print("Iniciando watchers...")
@@ -34,8 +81,9 @@ def run_integration_test():
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
         )
-        # Esperar a que watchers inicie (por ejemplo, 5 segundos)
-        time.sleep(5)
+        # Esperar a que watchers informe que ya está observando el directorio
+        if not wait_output(watchers_proc, "Observando:"):
+            print("watchers no comenzó a observar a tiempo.")
 
         # 4. Simular un cambio en el directorio monitoreado: crear un archivo o modificarlo
         test_file = os.path.join(temp_dir, "test_file.txt")
@@ -43,12 +91,13 @@ def run_integration_test():
             f.write("Contenido de prueba para integración.")
         print(f"Se creó/modificó el archivo: {test_file}")
 
-        # Esperar unos segundos para que watchers detecte el cambio y envíe el evento a watchers_wave
-        time.sleep(10)
+        # Esperar a que watchers_wave registre el evento enviado por watchers
+        if not wait_output(watchers_wave_proc, "Recibido evento"):
+            print("watchers_wave no recibió el evento a tiempo.")
 
         # 5. Consultar el endpoint /api/config de watchers_wave para verificar la información
         try:
-            response = requests.get("http://localhost:5000/api/config", timeout=5)
+            response = requests.get(WATCHERS_WAVE_CONFIG_URL, timeout=5)
             print("Respuesta de /api/config:")
             print(response.status_code)
             print(response.json())
@@ -7,55 +7,75 @@ Este script realiza:
   - El análisis periódico de un log de errores para ajustar parámetros (guardados en un archivo JSON).
   - La exposición de una API con Flask para recibir notificaciones y para que watchers consulte la configuración actual,
     incluyendo información del hardware.
-  - La consulta periódica del endpoint REST que expone el estado de la malla (definido en /api/malla),
+  - La consulta periódica, dentro del proceso, del estado de la malla que expone /api/malla,
     para ajustar parámetros y activar acciones correctivas si es necesario.
 """
 
-import json
+import atexit
 import math
 import logging
+import logging.handlers
+import queue
 import time
 import threading
 import os
-from flask import Flask, request, jsonify
+from flask import Flask, request
+import orjson
+import numpy as np
+from numba import njit, prange
 import psutil
-import requests
+from waitress import serve
 
-# Configuración de logging
+# Configuración de logging: los manejadores de la API solo encolan el registro y
+# un hilo aparte (QueueListener) hace la escritura, fuera de la ruta de la petición
+_COLA_LOG = queue.SimpleQueue()
 logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s"
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.handlers.QueueHandler(_COLA_LOG)],
 )
+_oyente_log = logging.handlers.QueueListener(_COLA_LOG, logging.StreamHandler())
+_oyente_log.start()
+atexit.register(_oyente_log.stop)  # Vacía la cola al salir
 
 # Rutas para los archivos de log y configuración
 ERROR_LOG = "/home/gerardo/Documentos/proyectos/mi-proyecto/watchers/error.log"
 AUTO_CONFIG = "/home/gerardo/Documentos/proyectos/mi-proyecto/watchers_wave/monitor_text/auto_config.json"
 OUTPUT_FILE = "/home/gerardo/Documentos/proyectos/mi-proyecto/watchers_wave/monitor_text/monitor_test.txt"
 
-# Crear directorios si no existen
-os.makedirs(os.path.dirname(ERROR_LOG), exist_ok=True)
-os.makedirs(os.path.dirname(AUTO_CONFIG), exist_ok=True)
-os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
+
+def crear_directorios():
+    """Crea los directorios de los archivos de log, configuración y salida si faltan."""
+    for directorio in {
+        os.path.dirname(p) for p in (ERROR_LOG, AUTO_CONFIG, OUTPUT_FILE)
+    }:
+        if not os.path.isdir(directorio):
+            os.makedirs(directorio, exist_ok=True)
+
 
 # --- Definición de la aplicación Flask ---
 app = Flask(__name__)
 
 
+def ojsonify(obj, status=200):
+    """Respuesta JSON serializada con orjson."""
+    return app.response_class(
+        orjson.dumps(obj), status=status, mimetype="application/json"
+    )
+
+
 @app.route("/api/event", methods=["POST"])
 def receive_event():
     data = request.get_json()
     if not data:
         logging.error("No se recibieron datos JSON en /api/event.")
-        return (
-            jsonify({"status": "error", "message": "No se recibieron datos JSON"}),
-            400,
+        return ojsonify(
+            {"status": "error", "message": "No se recibieron datos JSON"}, 400
         )
     event_id = data.get("event_id", "N/A")
     file_path = data.get("file_path", "N/A")
-    logging.info(f"Recibido evento {event_id} para el archivo: {file_path}")
-    return (
-        jsonify({"status": "success", "message": f"Evento {event_id} procesado"}),
-        200,
-    )
+    logging.info("Recibido evento %s para el archivo: %s", event_id, file_path)
+    return ojsonify({"status": "success", "message": f"Evento {event_id} procesado"})
 
 
 @app.route("/api/error", methods=["POST"])
@@ -63,113 +83,230 @@ def receive_error():
     data = request.get_json()
     if not data:
         logging.error("No se recibieron datos JSON en /api/error.")
-        return (
-            jsonify({"status": "error", "message": "No se recibieron datos JSON"}),
-            400,
+        return ojsonify(
+            {"status": "error", "message": "No se recibieron datos JSON"}, 400
         )
     error_id = data.get("error_id", "N/A")
     description = data.get("description", "Sin descripción")
     logging.info(
-        f"Reporte de error recibido: ID {error_id}, descripción: {description}"
+        "Reporte de error recibido: ID %s, descripción: %s", error_id, description
     )
-    return (
-        jsonify(
-            {"status": "success", "message": f"Reporte de error {error_id} procesado"}
-        ),
-        200,
+    return ojsonify(
+        {"status": "success", "message": f"Reporte de error {error_id} procesado"}
     )
 
 
+# Configuración parseada; solo se vuelve a leer si cambia el mtime del archivo
+_CFG_CACHE = {"mtime": -1, "data": {}}
+
+
 @app.route("/api/config", methods=["GET"])
 def get_config():
     try:
-        with open(AUTO_CONFIG, "r", encoding="utf-8") as f:
-            config_data = json.load(f)
+        mtime = os.stat(AUTO_CONFIG).st_mtime_ns
+        if mtime != _CFG_CACHE["mtime"]:
+            with open(AUTO_CONFIG, "rb") as f:
+                _CFG_CACHE["data"] = orjson.loads(f.read())
+            _CFG_CACHE["mtime"] = mtime
+        config_data = dict(_CFG_CACHE["data"])
     except FileNotFoundError:
         config_data = {}
-        with open(AUTO_CONFIG, "w", encoding="utf-8") as f:
-            json.dump(config_data, f, indent=4)
-        logging.info(f"Archivo de configuración creado en {AUTO_CONFIG}.")
+        with open(AUTO_CONFIG, "wb") as f:
+            f.write(orjson.dumps(config_data, option=orjson.OPT_INDENT_2))
+        logging.info("Archivo de configuración creado en %s.", AUTO_CONFIG)
     except Exception as e:
-        logging.error(f"Error al leer configuración: {e}")
+        logging.error("Error al leer configuración: %s", e)
         config_data = {}
     hw_info = get_hardware_info()
     config_data["hardware"] = hw_info
-    return jsonify({"status": "success", "config": config_data}), 200
+    return ojsonify({"status": "success", "config": config_data})
+
+
+# Estado simulado de la malla: es fijo, así que el cuerpo JSON se serializa una vez.
+# Puedes ajustar estos datos para que reflejen el estado real.
+MALLA_SIMULADA = {
+    "malla_A": [[{"x": 0, "y": 0, "amplitude": 1.0, "phase": 0.0}]],
+    "malla_B": [[{"x": 0, "y": 0, "amplitude": 0.5, "phase": 0.0}]],
+    "resonador": {
+        "T": 0.6,
+        "R": 0.4,
+        "lambda_foton": 600,
+        "tipo_onda": "FOTON_A",
+    },
+    "status": "success",
+}
+# Amplitudes de malla_A en un vector plano, fila a fila, derivadas de la propia malla
+MALLA_SIMULADA["amplitudes_flat"] = [
+    celda["amplitude"] for fila in MALLA_SIMULADA["malla_A"] for celda in fila
+]
+_MALLA_BODY = orjson.dumps(MALLA_SIMULADA)
+
+
+def _estado_malla():
+    """
+    Estado de la malla para consumo dentro del proceso. Falla con FileNotFoundError
+    si la simulación aún no ha generado su archivo de salida.
+    """
+    if not os.path.exists(OUTPUT_FILE):
+        raise FileNotFoundError(f"No existe el archivo de salida: {OUTPUT_FILE}")
+    return MALLA_SIMULADA
 
 
 @app.route("/api/malla", methods=["GET"])
 def get_malla():
-    # Este endpoint simula la obtención del estado de la malla.
-    # Puedes ajustar la lógica para que refleje el estado real.
+    # Este endpoint simula la obtención del estado de la malla para clientes externos.
     try:
-        with open(OUTPUT_FILE, "r", encoding="utf-8") as f:
-            contenido = f.read()
-        response_data = {
-            "malla_A": [[{"x": 0, "y": 0, "amplitude": 1.0, "phase": 0.0}]],
-            "malla_B": [[{"x": 0, "y": 0, "amplitude": 0.5, "phase": 0.0}]],
-            "resonador": {
-                "T": 0.6,
-                "R": 0.4,
-                "lambda_foton": 600,
-                "tipo_onda": "FOTON_A",
-            },
-            "status": "success",
-        }
-        return jsonify(response_data), 200
-    except Exception as e:
-        logging.error(f"Error al leer el archivo de salida: {e}")
-        return jsonify({"status": "error", "message": "No se pudo leer la malla"}), 500
+        _estado_malla()
+    except FileNotFoundError as e:
+        logging.error("%s", e)
+        return ojsonify({"status": "error", "message": "No se pudo leer la malla"}, 500)
+    return app.response_class(_MALLA_BODY, mimetype="application/json")
 
 
-def get_hardware_info():
+def _info_cpu():
+    """Datos de CPU: no cambian durante la vida del proceso, se leen una vez."""
     try:
-        cpu_info = {
+        cpu_freq = psutil.cpu_freq()
+        return {
             "cpu_count_physical": psutil.cpu_count(logical=False),
             "cpu_count_logical": psutil.cpu_count(logical=True),
-            "cpu_freq": psutil.cpu_freq()._asdict() if psutil.cpu_freq() else {},
+            "cpu_freq": cpu_freq._asdict() if cpu_freq else {},
         }
+    except Exception as e:
+        logging.error("Error obteniendo info de CPU: %s", e)
+        return None
+
+
+_CPU_INFO = _info_cpu()
+HW_INFO_TTL = 5.0  # Segundos que se reutiliza la lectura de memoria
+_HW_INFO_CACHE = {"ts": float("-inf"), "data": None}
+
+
+def get_hardware_info():
+    ahora = time.monotonic()
+    if ahora - _HW_INFO_CACHE["ts"] < HW_INFO_TTL:
+        return _HW_INFO_CACHE["data"]
+    if _CPU_INFO is None:
+        return {}
+    try:
         mem = psutil.virtual_memory()
-        return {"cpu": cpu_info, "memory": mem._asdict()}
+        data = {"cpu": _CPU_INFO, "memory": mem._asdict()}
     except Exception as e:
-        logging.error(f"Error obteniendo info de hardware: {e}")
+        logging.error("Error obteniendo info de hardware: %s", e)
         return {}
+    _HW_INFO_CACHE["ts"] = ahora
+    _HW_INFO_CACHE["data"] = data
+    return data
 
 
 # --- Simulación del oscilador 2D mediante RK4 ---
-def derivatives(t, x, y, vx, vy, omega, c):
-    dxdt = vx
-    dydt = vy
-    dvxdt = -(omega**2) * x - c * vx
-    dvydt = -(omega**2) * y - c * vy
-    return dxdt, dydt, dvxdt, dvydt
-
-
-def rk4_step(t, x, y, vx, vy, dt, omega, c):
-    dx1, dy1, dvx1, dvy1 = derivatives(t, x, y, vx, vy, omega, c)
-    x2 = x + dx1 * dt / 2
-    y2 = y + dy1 * dt / 2
-    vx2 = vx + dvx1 * dt / 2
-    vy2 = vy + dvy1 * dt / 2
-    dx2, dy2, dvx2, dvy2 = derivatives(t + dt / 2, x2, y2, vx2, vy2, omega, c)
-    x3 = x + dx2 * dt / 2
-    y3 = y + dy2 * dt / 2
-    vx3 = vx + dvx2 * dt / 2
-    vy3 = vy + dvy2 * dt / 2
-    dx3, dy3, dvx3, dvy3 = derivatives(t + dt / 2, x3, y3, vx3, vy3, omega, c)
-    x4 = x + dx3 * dt
-    y4 = y + dy3 * dt
-    vx4 = vx + dvx3 * dt
-    vy4 = vy + dvy3 * dt
-    dx4, dy4, dvx4, dvy4 = derivatives(t + dt, x4, y4, vx4, vy4, omega, c)
-    x_new = x + (dt / 6) * (dx1 + 2 * dx2 + 2 * dx3 + dx4)
-    y_new = y + (dt / 6) * (dy1 + 2 * dy2 + 2 * dy3 + dy4)
-    vx_new = vx + (dt / 6) * (dvx1 + 2 * dvx2 + 2 * dvx3 + dvx4)
-    vy_new = vy + (dt / 6) * (dvy1 + 2 * dvy2 + 2 * dvy3 + dvy4)
-    return x_new, y_new, vx_new, vy_new
-
-
-def run_simulation():
+@njit(cache=True, fastmath=True)
+def _integrar_rk4(x0, y0, vx0, vy0, omega, c, dt, steps, threshold, eventos):
+    """
+    Integra el oscilador 2D amortiguado con RK4 en código nativo y escribe en eventos
+    una fila (step, t, amplitude) por cada paso en que la amplitud alcanza el umbral.
+    Devuelve el número de filas escritas.
+    Las cuatro evaluaciones del campo vectorial van en línea, todo en escalares.
+    """
+    n_eventos = 0
+    w2 = omega * omega  # Se calcula una vez, no en cada evaluación del campo
+    h2 = dt / 2
+    h6 = dt / 6
+    x, y, vx, vy = x0, y0, vx0, vy0
+    # Se compara el cuadrado de la amplitud: la raíz solo se calcula en los eventos
+    threshold_sq = threshold * threshold
+    t = 0.0
+    for step in range(steps):
+        amp_sq = x * x + y * y
+        if amp_sq >= threshold_sq:
+            eventos[n_eventos, 0] = step
+            eventos[n_eventos, 1] = t
+            eventos[n_eventos, 2] = math.sqrt(amp_sq)
+            n_eventos += 1
+        # k1
+        dx1, dy1 = vx, vy
+        dvx1 = -(w2 * x + c * vx)
+        dvy1 = -(w2 * y + c * vy)
+        # k2
+        vx2 = vx + dvx1 * h2
+        vy2 = vy + dvy1 * h2
+        dx2, dy2 = vx2, vy2
+        dvx2 = -(w2 * (x + dx1 * h2) + c * vx2)
+        dvy2 = -(w2 * (y + dy1 * h2) + c * vy2)
+        # k3
+        vx3 = vx + dvx2 * h2
+        vy3 = vy + dvy2 * h2
+        dx3, dy3 = vx3, vy3
+        dvx3 = -(w2 * (x + dx2 * h2) + c * vx3)
+        dvy3 = -(w2 * (y + dy2 * h2) + c * vy3)
+        # k4
+        vx4 = vx + dvx3 * dt
+        vy4 = vy + dvy3 * dt
+        dx4, dy4 = vx4, vy4
+        dvx4 = -(w2 * (x + dx3 * dt) + c * vx4)
+        dvy4 = -(w2 * (y + dy3 * dt) + c * vy4)
+        x += h6 * (dx1 + 2 * dx2 + 2 * dx3 + dx4)
+        y += h6 * (dy1 + 2 * dy2 + 2 * dy3 + dy4)
+        vx += h6 * (dvx1 + 2 * dvx2 + 2 * dvx3 + dvx4)
+        vy += h6 * (dvy1 + 2 * dvy2 + 2 * dvy3 + dvy4)
+        t += dt
+    return n_eventos
+
+
+@njit(cache=True, fastmath=True)
+def _simulate_rk4(x0, y0, vx0, vy0, omega, c, dt, steps, threshold):
+    """Trayectoria única: devuelve sus filas (step, t, amplitude)."""
+    eventos = np.empty((steps, 3))
+    n_eventos = _integrar_rk4(x0, y0, vx0, vy0, omega, c, dt, steps, threshold, eventos)
+    return eventos[:n_eventos]
+
+
+@njit(cache=True, parallel=True, fastmath=True)
+def _simulate_batch(X0, Y0, VX0, VY0, omega, c, dt, steps, threshold):
+    """
+    Barrido de condiciones iniciales: las trayectorias son independientes y se
+    reparten entre los núcleos con prange. Devuelve eventos[i, :n_eventos[i]] con
+    las filas (step, t, amplitude) de la trayectoria i.
+    """
+    n = X0.shape[0]
+    eventos = np.empty((n, steps, 3))
+    n_eventos = np.empty(n, dtype=np.int64)
+    for i in prange(n):
+        n_eventos[i] = _integrar_rk4(
+            X0[i], Y0[i], VX0[i], VY0[i], omega, c, dt, steps, threshold, eventos[i]
+        )
+    return eventos, n_eventos
+
+
+def _eventos_analiticos(x0, y0, vx0, vy0, omega, c, dt, steps, threshold):
+    """
+    Solución cerrada del oscilador subamortiguado (c/2 < omega): cada eje es una
+    sinusoide amortiguada, así que toda la trayectoria se evalúa vectorizada sin
+    integrar. Devuelve las mismas filas (step, t, amplitude) que _simulate_rk4.
+    """
+    gamma = c / 2
+    wd = math.sqrt(omega * omega - gamma * gamma)
+    t = np.arange(steps) * dt
+    amortiguamiento = np.exp(-gamma * t)
+    coseno = np.cos(wd * t)
+    seno = np.sin(wd * t)
+    x = amortiguamiento * (x0 * coseno + (vx0 + gamma * x0) / wd * seno)
+    y = amortiguamiento * (y0 * coseno + (vy0 + gamma * y0) / wd * seno)
+    amp_sq = x * x + y * y
+    pasos = np.nonzero(amp_sq >= threshold * threshold)[0]
+    return np.column_stack((pasos, t[pasos], np.sqrt(amp_sq[pasos])))
+
+
+# Línea del archivo de salida por cada evento de amplitud
+FORMATO_EVENTO = "[WaveEvent] step=%d, t=%.2f, amplitude=%.3f\n"
+
+
+def run_simulation(realtime: bool = False):
+    """
+    Ejecuta la simulación y registra los eventos de amplitud. Con realtime=True los
+    eventos se emiten al ritmo de la simulación (dt segundos de reloj por paso);
+    por defecto se emiten en cuanto se calculan.
+    """
     logging.info("Iniciando simulación de watchers_wave (RK4).")
     omega = 2.0
     c = 0.2
@@ -178,61 +315,74 @@ def run_simulation():
     dt = 0.05
     total_time = 10.0
     steps = int(total_time / dt)
-    x, y = x0, y0
-    vx, vy = vx0, vy0
-    t = 0.0
     amplitude_threshold = 1.5
-    for step in range(steps):
-        amplitude = math.sqrt(x**2 + y**2)
-        if amplitude >= amplitude_threshold:
-            with open(OUTPUT_FILE, "a", encoding="utf-8") as f:
-                f.write(
-                    f"[WaveEvent] step={step}, t={t:.2f}, amplitude={amplitude:.3f}\n"
+    # El caso subamortiguado (el de estos parámetros) tiene solución cerrada; solo el
+    # sobreamortiguado o crítico (c/2 >= omega) se integra con RK4
+    simular = _eventos_analiticos if c / 2 < omega else _simulate_rk4
+    eventos = simular(x0, y0, vx0, vy0, omega, c, dt, steps, amplitude_threshold)
+    # Los eventos llegan en un único buffer (step, t, amplitude); la E/S se hace en
+    # Python sobre ellos, con el archivo abierto una sola vez
+    log_eventos = logging.getLogger().isEnabledFor(logging.INFO)
+    filas = eventos.tolist()
+    if realtime:
+        inicio = time.monotonic()
+        with open(OUTPUT_FILE, "a", encoding="utf-8") as f:
+            for step, t, amplitude in filas:
+                # Plazo absoluto por paso: no acumula deriva
+                time.sleep(max(0.0, inicio + int(step) * dt - time.monotonic()))
+                f.write(FORMATO_EVENTO % (step, t, amplitude))
+                if log_eventos:
+                    logging.info(
+                        "Evento: step=%d, t=%.2fs, amplitude=%.3f", step, t, amplitude
+                    )
+        time.sleep(max(0.0, inicio + steps * dt - time.monotonic()))
+    else:
+        # Sin ritmo de reloj todo el bloque de eventos se escribe de una vez
+        with open(OUTPUT_FILE, "a", encoding="utf-8") as f:
+            f.write("".join([FORMATO_EVENTO % tuple(fila) for fila in filas]))
+        if log_eventos:
+            for step, t, amplitude in filas:
+                logging.info(
+                    "Evento: step=%d, t=%.2fs, amplitude=%.3f", step, t, amplitude
                 )
-            logging.info(f"Evento: step={step}, t={t:.2f}s, amplitude={amplitude:.3f}")
-        x, y, vx, vy = rk4_step(t, x, y, vx, vy, dt, omega, c)
-        t += dt
-        time.sleep(0.2)
     logging.info("Simulación completada.")
 
 
 def ciclo_estado_malla(intervalo=10):
     while True:
         try:
-            response = requests.get("http://localhost:5000/api/malla", timeout=5)
-            response.raise_for_status()
-            estado = response.json()
-            amplitudes = [
-                celda.get("amplitude", 0)
-                for fila in estado.get("malla_A", [])
-                for celda in fila
-            ]
-            if amplitudes:
-                promedio = sum(amplitudes) / len(amplitudes)
-                logging.info(f"Amplitud promedio de malla_A: {promedio:.3f}")
+            # La malla vive en este mismo proceso: se consulta sin pasar por HTTP
+            estado = _estado_malla()
+            amplitudes = np.asarray(estado["amplitudes_flat"], dtype=np.float64)
+            if amplitudes.size:
+                promedio = float(amplitudes.mean())
+                logging.info("Amplitud promedio de malla_A: %.3f", promedio)
                 if promedio > 1.5:
                     logging.warning(
                         "La amplitud promedio supera el umbral. Activando acción correctiva..."
                     )
         except Exception as e:
-            logging.error(f"Error al obtener estado de la malla: {e}")
+            logging.error("Error al obtener estado de la malla: %s", e)
         time.sleep(intervalo)
 
 
 def run_flask():
-    app.run(host="0.0.0.0", port=5000)
+    # Servidor WSGI de producción: las peticiones se atienden en paralelo
+    serve(app, host="0.0.0.0", port=5000, threads=8)
 
 
 if __name__ == "__main__":
+    # Los directorios se crean al arrancar el servicio, no al importar el módulo
+    crear_directorios()
+
     # Inicia la API Flask en un hilo separado.
     flask_thread = threading.Thread(target=run_flask)
     flask_thread.daemon = True
     flask_thread.start()
 
-    # Inicia el ciclo de consulta del estado de la malla.
-    estado_thread = threading.Thread(target=ciclo_estado_malla, args=(10,))
-    estado_thread.daemon = True
-    estado_thread.start()
-
     # Ejecuta la simulación del oscilador 2D.
     run_simulation()
+
+    # El hilo principal queda libre tras la simulación y hace el sondeo de la malla,
+    # sin un hilo propio. La API sigue atendiendo en su hilo mientras tanto.
+    ciclo_estado_malla(10)